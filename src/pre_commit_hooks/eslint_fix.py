@@ -1,8 +1,11 @@
-import argparse
-import json
+import contextlib
+import functools
+import io
 import os
-import subprocess
-from collections.abc import Sequence
+import re
+import sys
+from collections import defaultdict
+from collections.abc import Callable, Iterator, Sequence
 from pathlib import Path
 
 # Mapping of lock files to their execution commands (inspired by package-manager-detector)
@@ -15,114 +18,380 @@ LOCK_FILES = {
     'npm-shrinkwrap.json': ['npx'],
 }
 
+# Mapping of marker files to the kind of project they indicate
+MARKER_TO_KIND = {
+    'deno.json': 'deno',
+    'deno.jsonc': 'deno',
+    'bun.lockb': 'bun',
+    'bun.lock': 'bun',
+    'package.json': 'package.json',
+    'pnpm-lock.yaml': 'lockfile',
+    'yarn.lock': 'lockfile',
+    'package-lock.json': 'lockfile',
+    'npm-shrinkwrap.json': 'lockfile',
+}
+ALL_MARKERS = frozenset(MARKER_TO_KIND)
+
+# Order in which markers are checked when several coexist in one directory
+# Deno comes first due to its unique execution style, then Bun, the packageManager field and other lock files
+MARKER_PRIORITY = (
+    'deno.json',
+    'deno.jsonc',
+    'bun.lockb',
+    'bun.lock',
+    'package.json',
+    'pnpm-lock.yaml',
+    'yarn.lock',
+    'package-lock.json',
+    'npm-shrinkwrap.json',
+)
+
+# Handlers for packageManager field names (Corepack spec), given the local eslint path and whether it exists
+_PM_DISPATCH: dict[str, Callable[[str, bool], tuple[list[str], str | None]]] = {
+    'pnpm': lambda local_eslint, has_local: ([], local_eslint) if has_local else (['pnpm', 'exec'], None),
+    'yarn': lambda local_eslint, has_local: ([], local_eslint) if has_local else (['yarn', 'run'], None),
+    # Bun runs the local eslint itself, the others rely on system node
+    'bun': lambda local_eslint, has_local: (['bun'], local_eslint) if has_local else (['bun', 'x'], None),
+    'npm': lambda local_eslint, has_local: ([], local_eslint) if has_local else (['npx'], None),
+}
+
+# Pulls the package manager name straight from the raw bytes of package.json
+_PACKAGE_MANAGER_RE = re.compile(rb'"packageManager"\s*:\s*"(pnpm|yarn|bun|npm)[@"]')
+
+# Tokens that change the nesting depth of a JSON document, strings are matched whole to skip the brackets inside them
+_JSON_NESTING_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]"]', re.DOTALL)
+
+# Reused for every package.json read, so walking many of them does not allocate a new buffer each time
+_READ_BUFFER = bytearray(65536)
+
+# Local eslint executable relative to a project directory (on Windows, it is eslint.cmd)
+_ESLINT_BIN = 'eslint.cmd' if os.name == 'nt' else 'eslint'
+_NODE_MODULES_BIN = ('node_modules', '.bin', _ESLINT_BIN)
+
+# POSIX can replace the process with eslint, Windows only emulates exec with a detached child process
+_CAN_EXEC = os.name != 'nt'
+
+# Values of PRE_COMMIT_HOOKS_QUIET that silence the "Running: ..." banner
+_TRUTHY_VALUES = frozenset({'1', 'true', 'yes', 'on'})
+
+# Detection results keyed by absolute directory path, kept for the duration of one run (see _detection_scope)
+_DETECTION_CACHE: dict[str, tuple[list[str], str | None]] = {}
+
+
+@functools.cache
+def _scan_dir(path: str) -> frozenset[str]:
+    """List entry names of a directory once per run, so marker checks are set lookups instead of stat calls."""
+    try:
+        with os.scandir(path) as it:
+            return frozenset(entry.name for entry in it)
+    except OSError:
+        return frozenset()
+
+
+@functools.cache
+def _which(name: str) -> str | None:
+    """Resolve an executable once per run."""
+    import shutil  # noqa: PLC0415
+
+    return shutil.which(name)
+
+
+@contextlib.contextmanager
+def _detection_scope() -> Iterator[None]:
+    """Share directory listings and detection results within one run, so later runs see filesystem changes."""
+    try:
+        yield
+    finally:
+        _scan_dir.cache_clear()
+        _which.cache_clear()
+        _DETECTION_CACHE.clear()
+
+
+def _has_local_eslint(local_eslint: str) -> bool:
+    """Check for the local eslint, only stat-ing it when the cached listing of node_modules/.bin has it."""
+    # The listing also holds dangling symlinks left behind by an uninstalled eslint, which exists() rejects
+    return _ESLINT_BIN in _scan_dir(os.path.dirname(local_eslint)) and os.path.exists(local_eslint)
+
+
+def _ancestors(path: str) -> Iterator[str]:
+    """Yield the path and its parents lazily, so the walk stops allocating once detection succeeds."""
+    yield path
+    parent = os.path.dirname(path)
+    while parent != path:
+        path = parent
+        yield path
+        parent = os.path.dirname(path)
+
+
+def _package_manager_name(pm_field: object) -> str | None:
+    """Extract the package manager name from a packageManager field value."""
+    # The field is "<name>@<version>", only the name matters
+    return pm_field.split('@', 1)[0] if isinstance(pm_field, str) else None
+
+
+def _stream_package_manager(f: io.RawIOBase) -> str | None:
+    """Stream the top-level packageManager field of an open package.json with ijson, stopping at the key."""
+    import ijson  # noqa: PLC0415
+
+    f.seek(0)
+    events = ijson.parse(f)
+    return _package_manager_name(
+        next((value for prefix, event, value in events if prefix == 'packageManager' and event == 'string'), None)
+    )
+
+
+def _is_top_level(data: bytes | bytearray, pos: int) -> bool:
+    """Check whether a position in a JSON document lies directly inside its top-level object."""
+    depth = 0
+    for token in _JSON_NESTING_RE.finditer(data, 0, pos):
+        char = data[token.start()]
+        if char in b'{[':
+            depth += 1
+        elif char in b'}]':
+            depth -= 1
+        elif token.end() - token.start() == 1:
+            # A lone quote is a string still open at pos, so pos is not a key
+            return False
+    return depth == 1
+
+
+def _fill_read_buffer(f: io.RawIOBase) -> int:
+    """Read a file into the shared buffer until it is full or the file ends, returning the size read."""
+    size = 0
+    with memoryview(_READ_BUFFER) as view:
+        # Unbuffered reads may legally return short, e.g. on network filesystems
+        while size < len(view):
+            n = f.readinto(view[size:])
+            if not n:
+                break
+            size += n
+    return size
+
+
+@functools.cache
+def _has_orjson() -> bool:
+    """Check whether the optional orjson parser is installed, without importing it."""
+    import importlib.util  # noqa: PLC0415
+
+    return importlib.util.find_spec('orjson') is not None
+
+
+def _json_loads(data: bytes | bytearray) -> object:
+    # Imported lazily, most runs never parse JSON
+    try:
+        from orjson import loads  # noqa: PLC0415
+    except ImportError:  # orjson is optional, the stdlib parser is a drop-in fallback
+        from json import loads  # noqa: PLC0415
+
+    return loads(data)
+
+
+def _read_package_manager(pkg_json_path: str) -> str | None:
+    """Read the package manager name from the packageManager field of package.json."""
+    # Read into the shared buffer, files that do not fit it are read whole instead
+    with open(pkg_json_path, 'rb', buffering=0) as f:
+        size = _fill_read_buffer(f)
+        if size == len(_READ_BUFFER) and not _has_orjson():
+            # Without orjson, stream large files from disk with ijson when it is installed
+            with contextlib.suppress(ImportError):
+                return _stream_package_manager(f)
+        data = _READ_BUFFER if size < len(_READ_BUFFER) else _READ_BUFFER + f.read()
+    end = size if data is _READ_BUFFER else len(data)
+
+    # Most projects rely on lockfiles instead, so skip parsing when the field cannot be present
+    key_count = data.count(b'"packageManager"', 0, end)
+    if not key_count:
+        return None
+
+    match = _PACKAGE_MANAGER_RE.search(data, 0, end)
+    if key_count == 1 and match and _is_top_level(data, match.start()):
+        return match.group(1).decode()
 
-def _check_package_manager_field(
-    path: Path, local_eslint: Path, has_local: bool
-) -> tuple[list[str], str | None] | None:
+    # Ambiguous (e.g. the key belongs to a nested object), fall back to a full parse
+    pkg_data = _json_loads(data[:end])
+    return _package_manager_name(pkg_data.get('packageManager') if isinstance(pkg_data, dict) else None)
+
+
+def _check_package_manager_field(path: str, local_eslint: str, has_local: bool) -> tuple[list[str], str | None] | None:
     """Check for packageManager field in package.json (Corepack spec)."""
-    pkg_json_path = path / 'package.json'
-    if pkg_json_path.exists():
-        try:
-            with open(pkg_json_path, encoding='utf-8') as f:
-                pkg_data = json.load(f)
-                pm_field = pkg_data.get('packageManager', '')
-
-                if pm_field:
-                    if pm_field.startswith('pnpm'):
-                        return ([], str(local_eslint)) if has_local else (['pnpm', 'exec'], None)
-                    if pm_field.startswith('yarn'):
-                        return ([], str(local_eslint)) if has_local else (['yarn', 'run'], None)
-                    if pm_field.startswith('bun'):
-                        return (['bun'], str(local_eslint)) if has_local else (['bun', 'x'], None)
-                    if pm_field.startswith('npm'):
-                        return ([], str(local_eslint)) if has_local else (['npx'], None)
-        except Exception:
-            pass
-    return None
+    try:
+        pm_name = _read_package_manager(os.path.join(path, 'package.json'))
+    except Exception:
+        return None
 
+    handler = _PM_DISPATCH.get(pm_name) if pm_name else None
+    return handler(local_eslint, has_local) if handler else None
 
-def detect_runtime_and_eslint(start_path: Path) -> tuple[list[str], str | None]:
-    """
-    Detect the runtime environment and local eslint path.
-    Returns: (execution command prefix, local eslint path)
-    """
-    current_path = start_path.absolute()
-    paths_to_check = [current_path, *list(current_path.parents)]
-
-    for path in paths_to_check:
-        # Detect local eslint in node_modules
-        # On Windows, it might be eslint.cmd
-        local_eslint = path / 'node_modules' / '.bin' / ('eslint.cmd' if os.name == 'nt' else 'eslint')
-        has_local = local_eslint.exists()
-
-        # 1. Check for Deno (Highest priority due to unique execution style)
-        if (path / 'deno.json').exists() or (path / 'deno.jsonc').exists():
-            if has_local:
-                # Use deno to run local eslint (bypassing node shebang)
-                return ['deno', 'run', '-A'], str(local_eslint)
-            # Use deno's remote npm mechanism
-            return ['deno', 'run', '-A', 'npm:eslint'], None
-
-        # 2. Check for Bun
-        if (path / 'bun.lockb').exists() or (path / 'bun.lock').exists():
+
+def _deno_command(local_eslint: str, has_local: bool) -> tuple[list[str], str | None]:
+    if has_local:
+        # Use deno to run local eslint (bypassing node shebang)
+        return ['deno', 'run', '-A'], local_eslint
+    # Use deno's remote npm mechanism
+    return ['deno', 'run', '-A', 'npm:eslint'], None
+
+
+def _detect_in_dir(path: str) -> tuple[list[str], str | None] | None:
+    """Detect the runtime from the markers of a single directory, or None if it has none."""
+    entries = _scan_dir(path)
+    markers = entries & ALL_MARKERS
+    if not markers:
+        return None
+
+    # Detect local eslint in node_modules
+    local_eslint = os.path.join(path, *_NODE_MODULES_BIN)
+    has_local = 'node_modules' in entries and _has_local_eslint(local_eslint)
+
+    for marker in MARKER_PRIORITY:
+        if marker not in markers:
+            continue
+        kind = MARKER_TO_KIND[marker]
+
+        if kind == 'deno':
+            return _deno_command(local_eslint, has_local)
+
+        if kind == 'bun':
             # Bun can run node_modules/.bin/eslint directly with great performance
-            return (['bun'], str(local_eslint)) if has_local else (['bun', 'x'], None)
+            return _PM_DISPATCH['bun'](local_eslint, has_local)
 
-        # 3. Check for packageManager field in package.json (Corepack spec)
+        if kind == 'lockfile':
+            # Direct execution is fastest if local eslint exists (depends on system node)
+            return ([], local_eslint) if has_local else (LOCK_FILES[marker], None)
+
+        # package.json is only conclusive when it has a packageManager field (Corepack spec)
         pm_result = _check_package_manager_field(path, local_eslint, has_local)
         if pm_result:
             return pm_result
+    return None
 
-        # 4. Check for Lockfiles
-        for lock_file, pm_cmd in LOCK_FILES.items():
-            if (path / lock_file).exists():
-                # Direct execution is fastest if local eslint exists (depends on system node)
-                return ([], str(local_eslint)) if has_local else (pm_cmd, None)
 
-    return ([], str(local_eslint)) if has_local else (['npx'], None)
+def _default_runtime(path: str) -> tuple[list[str], str | None]:
+    """Fall back to the local eslint of the last checked directory, or npx, when nothing was detected."""
+    local_eslint = os.path.join(path, *_NODE_MODULES_BIN)
+    return ([], local_eslint) if _has_local_eslint(local_eslint) else (['npx'], None)
 
 
-def main(argv: Sequence[str] | None = None) -> int:
-    parser = argparse.ArgumentParser()
-    parser.add_argument('filenames', nargs='*', help='Filenames to fix')
-    args = parser.parse_args(argv)
+def _walk(current_path: str) -> tuple[list[str], str | None]:
+    """Walk up from an absolute directory until a runtime is detected."""
+    visited: list[str] = []
 
-    if not args.filenames:
-        return 0
+    for path in _ancestors(current_path):
+        result = _DETECTION_CACHE.get(path)
+        if result is not None:
+            break
+        visited.append(path)
+        result = _detect_in_dir(path)
+        if result is not None:
+            break
+        # Stop at the repository root, markers above it belong to unrelated projects
+        if '.git' in _scan_dir(path):
+            result = _default_runtime(path)
+            break
+    else:
+        result = _default_runtime(path)
 
-    # Detect directory of the first file
-    first_file = Path(args.filenames[0])
-    start_dir = first_file.parent if first_file.is_file() else first_file
+    # Every directory walked through resolves to the same answer, so remember it for all of them
+    for path in visited:
+        _DETECTION_CACHE[path] = result
 
-    cmd_prefix, local_eslint_path = detect_runtime_and_eslint(start_dir)
+    return result
 
+
+def detect_runtime_and_eslint(start_path: Path) -> tuple[list[str], str | None]:
+    """
+    Detect the runtime environment and local eslint path.
+    Returns: (execution command prefix, local eslint path)
+    """
+    # Plain strings keep the walk cheap, pathlib allocates a new object for every probe
+    with _detection_scope():
+        cmd_prefix, local_eslint = _walk(os.path.abspath(start_path))
+    return list(cmd_prefix), local_eslint
+
+
+def _run_eslint(
+    cmd_prefix: list[str], local_eslint_path: str | None, filenames: list[str], replace_process: bool = False
+) -> int:
+    """Run eslint --fix on the given files and return its exit code, or exec into it if replace_process is set."""
     # Build final command
     # Priority 1: [runtime] [local_eslint] --fix [files]
     # Priority 2: [pkg_manager_exec] eslint --fix [files]
     if local_eslint_path:
         # Use local path directly, add prefix (e.g., bun, deno run) if exists
-        cmd = [*cmd_prefix, local_eslint_path, '--fix', *args.filenames]
+        cmd = [*cmd_prefix, local_eslint_path, '--fix', *filenames]
     elif cmd_prefix and cmd_prefix[0] == 'deno':
         # Special case for Deno (deno run -A npm:eslint --fix ...)
-        cmd = [*cmd_prefix, '--fix', *args.filenames]
+        cmd = [*cmd_prefix, '--fix', *filenames]
     else:
         # Use package manager (e.g., pnpm exec eslint --fix ...)
-        cmd = [*cmd_prefix, 'eslint', '--fix', *args.filenames]
+        cmd = [*cmd_prefix, 'eslint', '--fix', *filenames]
+
+    if os.environ.get('PRE_COMMIT_HOOKS_QUIET', '').strip().lower() not in _TRUTHY_VALUES:
+        # Quote arguments so the banner can be copied back into a shell, even for paths with spaces
+        import shlex  # noqa: PLC0415
+
+        sys.stdout.write(f'Running: {shlex.join(cmd)}\n')
+
+    # Resolve the executable up front, a failed process launch is far more expensive than a PATH scan
+    executable = _which(cmd[0])
+    if executable is None:
+        print(f"Error: Command '{cmd[0]}' not found. Please ensure it is installed.")
+        return 1
+    cmd[0] = executable
+
+    if replace_process:
+        # Nothing runs after eslint, so let it take over instead of keeping Python alive while it lints
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            os.execv(executable, cmd)
+        except OSError as e:
+            print(f'An unexpected error occurred: {e}')
+            return 1
 
-    print(f'Running: {" ".join(cmd)}')
+    # Only needed when eslint cannot replace this process, so it is not imported up front
+    import subprocess  # noqa: PLC0415
 
     try:
         # Run the command and stream output to terminal
         result = subprocess.run(cmd, capture_output=False, check=False)
         return result.returncode
-    except FileNotFoundError:
-        cmd_name = cmd[0] if cmd else 'unknown'
-        print(f"Error: Command '{cmd_name}' not found. Please ensure it is installed.")
-        return 1
     except Exception as e:
         print(f'An unexpected error occurred: {e}')
         return 1
 
 
+def main(argv: Sequence[str] | None = None) -> int:
+    # Filenames are the only arguments, argparse would dominate startup time for no benefit
+    # Drop duplicates and files deleted since staging, there is no point starting eslint for nothing
+    filenames = [f for f in dict.fromkeys(argv if argv is not None else sys.argv[1:]) if os.path.exists(f)]
+    if not filenames:
+        return 0
+
+    # Group files by directory so each directory is detected only once
+    files_by_dir: defaultdict[str, list[str]] = defaultdict(list)
+    for filename in filenames:
+        path = os.path.abspath(filename)
+        # A directory argument is detected from itself, a file from the directory containing it
+        files_by_dir[path if os.path.isdir(path) else os.path.dirname(path)].append(filename)
+
+    # Then group by detected runtime, so eslint runs once per detected runtime rather than once per directory
+    with _detection_scope():
+        files_by_runtime: defaultdict[tuple[tuple[str, ...], str | None], list[str]] = defaultdict(list)
+        for start_dir, dir_files in files_by_dir.items():
+            cmd_prefix, local_eslint_path = _walk(start_dir)
+            files_by_runtime[tuple(cmd_prefix), local_eslint_path].extend(dir_files)
+
+        # A single eslint run is the last thing the console script does, so it can hand the process over to it
+        # In-process callers pass argv explicitly and get the exit code back instead
+        replace_process = _CAN_EXEC and argv is None and len(files_by_runtime) == 1
+        returncode = 0
+        for (cmd_prefix, local_eslint_path), runtime_files in files_by_runtime.items():
+            run_returncode = _run_eslint(list(cmd_prefix), local_eslint_path, runtime_files, replace_process)
+            # Report the first failure, but still fix the files of every other runtime
+            if not returncode:
+                returncode = run_returncode
+    return returncode
+
+
 if __name__ == '__main__':
     raise SystemExit(main())
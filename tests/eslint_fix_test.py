@@ -1,5 +1,7 @@
+import io
 import json
 import os
+from collections.abc import Iterator
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
@@ -14,6 +16,13 @@ def temp_project(tmp_path: Path) -> Path:
     return tmp_path
 
 
+@pytest.fixture
+def mock_which() -> Iterator[MagicMock]:
+    """Fixture to resolve every executable under /usr/bin."""
+    with patch('shutil.which', side_effect=lambda name: f'/usr/bin/{name}') as mock:
+        yield mock
+
+
 def test_detect_pnpm_with_local_eslint(temp_project: Path) -> None:
     """Test detection when pnpm-lock.yaml and local eslint exist."""
     (temp_project / 'pnpm-lock.yaml').touch()
@@ -44,6 +53,21 @@ def test_detect_bun_with_local_eslint(temp_project: Path) -> None:
     assert local_path == str(eslint_path)
 
 
+@pytest.mark.skipif(os.name == 'nt', reason='symlinks require privileges on Windows')
+def test_detect_dangling_local_eslint(temp_project: Path) -> None:
+    """Test that a dangling node_modules/.bin/eslint symlink is not treated as a local eslint."""
+    (temp_project / 'pnpm-lock.yaml').touch()
+    bin_dir = temp_project / 'node_modules' / '.bin'
+    bin_dir.mkdir(parents=True)
+    (bin_dir / 'eslint').symlink_to(temp_project / 'node_modules' / 'eslint' / 'bin' / 'eslint.js')
+
+    cmd_prefix, local_path = detect_runtime_and_eslint(temp_project)
+
+    # Should fall back to the package manager since the eslint package was removed
+    assert cmd_prefix == ['pnpm', 'exec']
+    assert local_path is None
+
+
 def test_detect_deno_with_local_eslint(temp_project: Path) -> None:
     """Test detection when deno.json and local eslint exist (Deno runtime should be used)."""
     (temp_project / 'deno.json').touch()
@@ -82,6 +106,209 @@ def test_detect_package_manager_field(temp_project: Path) -> None:
     assert local_path is None
 
 
+def test_package_json_without_field_is_not_parsed(temp_project: Path) -> None:
+    """Test that package.json is not parsed when it has no packageManager field."""
+    (temp_project / 'package.json').write_text(json.dumps({'name': 'app'}))
+    (temp_project / 'yarn.lock').touch()
+
+    with patch('pre_commit_hooks.eslint_fix._json_loads') as mock_loads:
+        cmd_prefix, local_path = detect_runtime_and_eslint(temp_project)
+
+    mock_loads.assert_not_called()
+    assert cmd_prefix == ['yarn', 'run']
+    assert local_path is None
+
+
+@pytest.mark.parametrize(
+    ('pm_field', 'expected'),
+    [
+        ('pnpm@9.0.0', ['pnpm', 'exec']),
+        ('yarn@4.1.0', ['yarn', 'run']),
+        ('bun@1.1.0', ['bun', 'x']),
+        ('npm@10.5.0', ['npx']),
+    ],
+)
+def test_package_manager_field_without_parsing(temp_project: Path, pm_field: str, expected: list[str]) -> None:
+    """Test that a plain packageManager field is resolved without a full JSON parse."""
+    (temp_project / 'package.json').write_text(json.dumps({'name': 'app', 'packageManager': pm_field}, indent=2))
+
+    with patch('pre_commit_hooks.eslint_fix._json_loads') as mock_loads:
+        cmd_prefix, local_path = detect_runtime_and_eslint(temp_project)
+
+    mock_loads.assert_not_called()
+    assert cmd_prefix == expected
+    assert local_path is None
+
+
+@pytest.mark.parametrize('padding', [0, 65536])
+def test_package_manager_field_read_buffer(temp_project: Path, padding: int) -> None:
+    """Test that the packageManager field is found regardless of how package.json fits the read buffer."""
+    sub_dir = temp_project / 'packages' / 'app'
+    sub_dir.mkdir(parents=True)
+    # A longer package.json read first must not leak into the next read
+    (sub_dir / 'package.json').write_text(json.dumps({'name': 'app', 'description': 'x' * 1000}))
+    pkg_data = {'dependencies': {f'dep-{i}': '1.0.0' for i in range(padding // 20)}, 'packageManager': 'yarn@4.1.0'}
+    (temp_project / 'package.json').write_text(json.dumps(pkg_data))
+
+    cmd_prefix, local_path = detect_runtime_and_eslint(sub_dir)
+
+    assert cmd_prefix == ['yarn', 'run']
+    assert local_path is None
+
+
+def test_package_manager_field_short_reads(temp_project: Path) -> None:
+    """Test that package.json is read whole even when the filesystem returns short reads."""
+    pkg_data = {'description': 'x' * 1000, 'packageManager': 'yarn@4.1.0'}
+    (temp_project / 'package.json').write_text(json.dumps(pkg_data))
+
+    class ShortReadFile(io.FileIO):
+        def readinto(self, buffer: memoryview) -> int | None:
+            return super().readinto(buffer[:100])
+
+    with patch('pre_commit_hooks.eslint_fix.open', create=True, side_effect=lambda path, *_, **__: ShortReadFile(path)):
+        cmd_prefix, local_path = detect_runtime_and_eslint(temp_project)
+
+    assert cmd_prefix == ['yarn', 'run']
+    assert local_path is None
+
+
+def test_package_manager_field_ambiguous(temp_project: Path) -> None:
+    """Test that a packageManager key nested elsewhere falls back to a full JSON parse."""
+    pkg_data = {'config': {'packageManager': 'npm@10.5.0'}, 'packageManager': 'yarn@4.1.0'}
+    (temp_project / 'package.json').write_text(json.dumps(pkg_data))
+
+    cmd_prefix, local_path = detect_runtime_and_eslint(temp_project)
+
+    assert cmd_prefix == ['yarn', 'run']
+    assert local_path is None
+
+
+def test_package_manager_field_ambiguous_without_orjson(temp_project: Path) -> None:
+    """Test that the full JSON parse falls back to the stdlib parser when orjson is not installed."""
+    pkg_data = {'config': {'packageManager': 'npm@10.5.0'}, 'packageManager': 'yarn@4.1.0'}
+    (temp_project / 'package.json').write_text(json.dumps(pkg_data))
+
+    with patch.dict('sys.modules', {'orjson': None}):
+        cmd_prefix, local_path = detect_runtime_and_eslint(temp_project)
+
+    assert cmd_prefix == ['yarn', 'run']
+    assert local_path is None
+
+
+@pytest.mark.parametrize(
+    'pkg_json',
+    [
+        '{"config": {"packageManager": "npm@10.5.0"}}',
+        '{"engines": [{"packageManager": "npm@10.5.0"}]}',
+        '{"description": "{\\"", "config": {"packageManager": "npm@10.5.0"}}',
+    ],
+)
+def test_package_manager_field_nested_only(temp_project: Path, pkg_json: str) -> None:
+    """Test that a single packageManager key inside a nested object is not read as the top-level field."""
+    (temp_project / 'package.json').write_text(pkg_json)
+    (temp_project / 'pnpm-lock.yaml').touch()
+
+    cmd_prefix, local_path = detect_runtime_and_eslint(temp_project)
+
+    assert cmd_prefix == ['pnpm', 'exec']
+    assert local_path is None
+
+
+def test_lockfile_priority(temp_project: Path) -> None:
+    """Test that pnpm-lock.yaml wins when several lockfiles coexist."""
+    (temp_project / 'package-lock.json').touch()
+    (temp_project / 'yarn.lock').touch()
+    (temp_project / 'pnpm-lock.yaml').touch()
+
+    cmd_prefix, local_path = detect_runtime_and_eslint(temp_project)
+
+    assert cmd_prefix == ['pnpm', 'exec']
+    assert local_path is None
+
+
+@pytest.fixture
+def large_package_json(temp_project: Path) -> Path:
+    """Fixture to provide a package.json too large for the read buffer, with a nested packageManager key."""
+    pkg_data = {
+        'config': {'packageManager': 'npm@10.5.0'},
+        'dependencies': {f'dep-{i}': '1.0.0' for i in range(5000)},
+        'packageManager': 'bun@1.1.0',
+    }
+    (temp_project / 'package.json').write_text(json.dumps(pkg_data))
+    return temp_project
+
+
+@pytest.fixture
+def mock_ijson() -> Iterator[MagicMock]:
+    """Fixture to stub ijson, yielding top-level events parsed from the file it is handed."""
+
+    def parse(f: io.RawIOBase) -> Iterator[tuple[str, str, object]]:
+        for key, value in json.load(f).items():
+            yield key, 'string' if isinstance(value, str) else 'start_map', value
+
+    with patch.dict('sys.modules', {'ijson': MagicMock(parse=MagicMock(side_effect=parse))}) as modules:
+        yield modules['ijson']
+
+
+def test_large_package_json_streamed_without_orjson(large_package_json: Path, mock_ijson: MagicMock) -> None:
+    """Test that without orjson, a package.json larger than the read buffer is streamed from disk with ijson."""
+    with (
+        patch('pre_commit_hooks.eslint_fix._has_orjson', return_value=False),
+        patch('pre_commit_hooks.eslint_fix._json_loads') as mock_loads,
+    ):
+        cmd_prefix, local_path = detect_runtime_and_eslint(large_package_json)
+
+    mock_ijson.parse.assert_called_once()
+    assert isinstance(mock_ijson.parse.call_args.args[0], io.RawIOBase)
+    mock_loads.assert_not_called()
+    assert cmd_prefix == ['bun', 'x']
+    assert local_path is None
+
+
+def test_large_package_json_parsed_with_orjson(large_package_json: Path, mock_ijson: MagicMock) -> None:
+    """Test that orjson is preferred over ijson when it is installed."""
+    with patch('pre_commit_hooks.eslint_fix._has_orjson', return_value=True):
+        cmd_prefix, local_path = detect_runtime_and_eslint(large_package_json)
+
+    mock_ijson.parse.assert_not_called()
+    assert cmd_prefix == ['bun', 'x']
+    assert local_path is None
+
+
+def test_large_package_json_without_ijson(large_package_json: Path) -> None:
+    """Test that a large package.json is parsed whole when neither orjson nor ijson is installed."""
+    with (
+        patch('pre_commit_hooks.eslint_fix._has_orjson', return_value=False),
+        patch.dict('sys.modules', {'ijson': None}),
+    ):
+        cmd_prefix, local_path = detect_runtime_and_eslint(large_package_json)
+
+    assert cmd_prefix == ['bun', 'x']
+    assert local_path is None
+
+
+def test_package_manager_field_unknown(temp_project: Path) -> None:
+    """Test that an unsupported packageManager is ignored in favour of lockfiles."""
+    (temp_project / 'package.json').write_text(json.dumps({'packageManager': 'bunx@1.0.0'}))
+    (temp_project / 'package-lock.json').touch()
+
+    cmd_prefix, local_path = detect_runtime_and_eslint(temp_project)
+
+    assert cmd_prefix == ['npx']
+    assert local_path is None
+
+
+def test_marker_priority(temp_project: Path) -> None:
+    """Test that Deno outranks Bun, which outranks the packageManager field and other lockfiles."""
+    (temp_project / 'package.json').write_text(json.dumps({'packageManager': 'yarn@4.1.0'}))
+    (temp_project / 'pnpm-lock.yaml').touch()
+    (temp_project / 'bun.lock').touch()
+    assert detect_runtime_and_eslint(temp_project) == (['bun', 'x'], None)
+
+    (temp_project / 'deno.jsonc').touch()
+    assert detect_runtime_and_eslint(temp_project) == (['deno', 'run', '-A', 'npm:eslint'], None)
+
+
 def test_recursive_lookup(temp_project: Path) -> None:
     """Test that it can find the root package manager from a sub-directory."""
     (temp_project / 'yarn.lock').touch()
@@ -95,7 +322,49 @@ def test_recursive_lookup(temp_project: Path) -> None:
     assert local_path is None
 
 
+def test_detection_sees_changes_between_calls(temp_project: Path) -> None:
+    """Test that a lockfile added after a detection is picked up by the next one."""
+    (temp_project / 'yarn.lock').touch()
+    sub_dir = temp_project / 'packages' / 'app'
+    sub_dir.mkdir(parents=True)
+    assert detect_runtime_and_eslint(sub_dir) == (['yarn', 'run'], None)
+
+    (sub_dir / 'pnpm-lock.yaml').touch()
+
+    assert detect_runtime_and_eslint(sub_dir) == (['pnpm', 'exec'], None)
+
+
+def test_lookup_stops_at_repository_root(temp_project: Path) -> None:
+    """Test that markers above the repository root are ignored."""
+    (temp_project / 'yarn.lock').touch()
+    repo_dir = temp_project / 'repo'
+    (repo_dir / '.git').mkdir(parents=True)
+    sub_dir = repo_dir / 'src'
+    sub_dir.mkdir()
+
+    cmd_prefix, local_path = detect_runtime_and_eslint(sub_dir)
+
+    # Should not pick up yarn.lock outside the repository
+    assert cmd_prefix == ['npx']
+    assert local_path is None
+
+
+def test_lookup_stops_at_repository_root_with_local_eslint(temp_project: Path) -> None:
+    """Test that the repository root's local eslint is used when no package manager is detected."""
+    (temp_project / '.git').mkdir()
+    bin_dir = temp_project / 'node_modules' / '.bin'
+    bin_dir.mkdir(parents=True)
+    eslint_path = bin_dir / ('eslint.cmd' if os.name == 'nt' else 'eslint')
+    eslint_path.touch()
+
+    cmd_prefix, local_path = detect_runtime_and_eslint(temp_project)
+
+    assert cmd_prefix == []
+    assert local_path == str(eslint_path)
+
+
 @patch('subprocess.run')
+@pytest.mark.usefixtures('mock_which')
 def test_main_execution_pnpm(mock_run: MagicMock, temp_project: Path) -> None:
     """Test the full main function execution flow for a pnpm project."""
     mock_run.return_value = MagicMock(returncode=0)
@@ -111,11 +380,12 @@ def test_main_execution_pnpm(mock_run: MagicMock, temp_project: Path) -> None:
 
     assert exit_code == 0
     # Verify the generated command
-    expected_cmd = ['pnpm', 'exec', 'eslint', '--fix', str(test_file)]
+    expected_cmd = ['/usr/bin/pnpm', 'exec', 'eslint', '--fix', str(test_file)]
     mock_run.assert_called_once_with(expected_cmd, capture_output=False, check=False)
 
 
 @patch('subprocess.run')
+@pytest.mark.usefixtures('mock_which')
 def test_main_execution_local_bun(mock_run: MagicMock, temp_project: Path) -> None:
     """Test the full main function execution flow for a Bun project with local eslint."""
     mock_run.return_value = MagicMock(returncode=0)
@@ -134,16 +404,140 @@ def test_main_execution_local_bun(mock_run: MagicMock, temp_project: Path) -> No
 
     assert exit_code == 0
     # Verify the generated command uses bun to run the local eslint path
-    expected_cmd = ['bun', str(eslint_path), '--fix', str(test_file)]
+    expected_cmd = ['/usr/bin/bun', str(eslint_path), '--fix', str(test_file)]
     mock_run.assert_called_once_with(expected_cmd, capture_output=False, check=False)
 
 
+@patch('subprocess.run')
+@pytest.mark.usefixtures('mock_which')
+def test_main_banner_quotes_paths(mock_run: MagicMock, temp_project: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test that the printed command quotes paths containing spaces."""
+    mock_run.return_value = MagicMock(returncode=0)
+
+    (temp_project / 'pnpm-lock.yaml').touch()
+    test_file = temp_project / 'my file.js'
+    test_file.touch()
+
+    main([str(test_file)])
+
+    assert f"Running: pnpm exec eslint --fix '{test_file}'" in capsys.readouterr().out
+
+
+@patch('subprocess.run')
+@pytest.mark.usefixtures('mock_which')
+@pytest.mark.parametrize('value', ['1', 'true', 'YES', ' on '])
+def test_main_quiet_banner(
+    mock_run: MagicMock,
+    temp_project: Path,
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+    value: str,
+) -> None:
+    """Test that truthy PRE_COMMIT_HOOKS_QUIET values suppress the printed command."""
+    mock_run.return_value = MagicMock(returncode=0)
+    monkeypatch.setenv('PRE_COMMIT_HOOKS_QUIET', value)
+
+    (temp_project / 'pnpm-lock.yaml').touch()
+    test_file = temp_project / 'index.js'
+    test_file.touch()
+
+    assert main([str(test_file)]) == 0
+    assert capsys.readouterr().out == ''
+    mock_run.assert_called_once()
+
+
+@patch('subprocess.run')
+@pytest.mark.usefixtures('mock_which')
+@pytest.mark.parametrize('value', ['0', 'false', 'no', ''])
+def test_main_quiet_banner_falsy(
+    mock_run: MagicMock,
+    temp_project: Path,
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+    value: str,
+) -> None:
+    """Test that other PRE_COMMIT_HOOKS_QUIET values keep the printed command."""
+    mock_run.return_value = MagicMock(returncode=0)
+    monkeypatch.setenv('PRE_COMMIT_HOOKS_QUIET', value)
+
+    (temp_project / 'pnpm-lock.yaml').touch()
+    test_file = temp_project / 'index.js'
+    test_file.touch()
+
+    assert main([str(test_file)]) == 0
+    assert 'Running: pnpm exec eslint --fix' in capsys.readouterr().out
+    mock_run.assert_called_once()
+
+
 def test_main_no_files() -> None:
     """Test that main returns 0 immediately if no files are provided."""
     assert main([]) == 0
 
 
 @patch('subprocess.run')
+@patch('os.execv', side_effect=SystemExit(0))
+@pytest.mark.usefixtures('mock_which')
+def test_main_exec_single_run(mock_execv: MagicMock, mock_run: MagicMock, temp_project: Path) -> None:
+    """Test that a single eslint run replaces the Python process when exec is available."""
+    (temp_project / 'pnpm-lock.yaml').touch()
+    test_file = temp_project / 'index.js'
+    test_file.touch()
+
+    with (
+        patch('pre_commit_hooks.eslint_fix._CAN_EXEC', True),
+        patch('sys.argv', ['eslint-fix', str(test_file)]),
+        pytest.raises(SystemExit),
+    ):
+        main()
+
+    expected_cmd = ['/usr/bin/pnpm', 'exec', 'eslint', '--fix', str(test_file)]
+    mock_execv.assert_called_once_with('/usr/bin/pnpm', expected_cmd)
+    mock_run.assert_not_called()
+
+
+@patch('subprocess.run')
+@patch('os.execv')
+@pytest.mark.usefixtures('mock_which')
+def test_main_explicit_argv_does_not_exec(mock_execv: MagicMock, mock_run: MagicMock, temp_project: Path) -> None:
+    """Test that an in-process call with explicit argv runs eslint as a child process."""
+    mock_run.return_value = MagicMock(returncode=0)
+    (temp_project / 'pnpm-lock.yaml').touch()
+    test_file = temp_project / 'index.js'
+    test_file.touch()
+
+    with patch('pre_commit_hooks.eslint_fix._CAN_EXEC', True):
+        assert main([str(test_file)]) == 0
+
+    mock_execv.assert_not_called()
+    mock_run.assert_called_once()
+
+
+@patch('subprocess.run')
+def test_main_missing_files(mock_run: MagicMock, temp_project: Path) -> None:
+    """Test that main returns 0 without running eslint if none of the files exist."""
+    assert main([str(temp_project / 'deleted.js')]) == 0
+    mock_run.assert_not_called()
+
+
+@patch('subprocess.run')
+@pytest.mark.usefixtures('mock_which')
+def test_main_filters_files(mock_run: MagicMock, temp_project: Path) -> None:
+    """Test that duplicate and missing files are not passed to eslint."""
+    mock_run.return_value = MagicMock(returncode=0)
+
+    (temp_project / 'pnpm-lock.yaml').touch()
+    test_file = temp_project / 'index.js'
+    test_file.touch()
+
+    exit_code = main([str(test_file), str(temp_project / 'deleted.js'), str(test_file)])
+
+    assert exit_code == 0
+    expected_cmd = ['/usr/bin/pnpm', 'exec', 'eslint', '--fix', str(test_file)]
+    mock_run.assert_called_once_with(expected_cmd, capture_output=False, check=False)
+
+
+@patch('subprocess.run')
+@pytest.mark.usefixtures('mock_which')
 def test_main_error_handling(mock_run: MagicMock, temp_project: Path) -> None:
     """Test that main returns the exit code of the subprocess if it fails."""
     mock_run.return_value = MagicMock(returncode=1)
@@ -156,3 +550,81 @@ def test_main_error_handling(mock_run: MagicMock, temp_project: Path) -> None:
     mock_run.assert_called_once()
     assert mock_run.call_args.kwargs['capture_output'] is False
     assert mock_run.call_args.kwargs['check'] is False
+
+
+@patch('subprocess.run')
+def test_main_command_not_found(mock_run: MagicMock, temp_project: Path) -> None:
+    """Test that main fails without launching a process when the command is not installed."""
+    (temp_project / 'pnpm-lock.yaml').touch()
+    test_file = temp_project / 'index.js'
+    test_file.touch()
+
+    with patch('shutil.which', return_value=None) as mock_which:
+        exit_code = main([str(test_file)])
+
+    assert exit_code == 1
+    mock_which.assert_called_once_with('pnpm')
+    mock_run.assert_not_called()
+
+
+@patch('subprocess.run')
+@pytest.mark.usefixtures('mock_which')
+def test_main_groups_files_by_runtime(mock_run: MagicMock, temp_project: Path) -> None:
+    """Test that eslint runs once per detected runtime, even for files spread over several directories."""
+    mock_run.return_value = MagicMock(returncode=0)
+
+    # Setup a pnpm project and a nested yarn project
+    (temp_project / 'pnpm-lock.yaml').touch()
+    (temp_project / 'legacy').mkdir()
+    (temp_project / 'legacy' / 'yarn.lock').touch()
+    pnpm_files = [temp_project / 'src' / 'a.js', temp_project / 'lib' / 'b.js']
+    yarn_files = [temp_project / 'legacy' / 'c.js']
+    for test_file in [*pnpm_files, *yarn_files]:
+        test_file.parent.mkdir(exist_ok=True)
+        test_file.touch()
+
+    exit_code = main([str(f) for f in [pnpm_files[0], yarn_files[0], pnpm_files[1]]])
+
+    assert exit_code == 0
+    assert [c.args[0] for c in mock_run.call_args_list] == [
+        ['/usr/bin/pnpm', 'exec', 'eslint', '--fix', *map(str, pnpm_files)],
+        ['/usr/bin/yarn', 'run', 'eslint', '--fix', *map(str, yarn_files)],
+    ]
+
+
+@patch('subprocess.run')
+@pytest.mark.usefixtures('mock_which')
+def test_main_scans_shared_ancestors_once(mock_run: MagicMock, temp_project: Path) -> None:
+    """Test that directories shared by several files are only scanned once per run."""
+    mock_run.return_value = MagicMock(returncode=0)
+
+    (temp_project / 'pnpm-lock.yaml').touch()
+    test_files = [temp_project / 'packages' / name / 'index.js' for name in ('app', 'lib')]
+    for test_file in test_files:
+        test_file.parent.mkdir(parents=True)
+        test_file.touch()
+
+    with patch('os.scandir', wraps=os.scandir) as mock_scandir:
+        assert main([str(f) for f in test_files]) == 0
+
+    scanned = [os.fspath(c.args[0]) for c in mock_scandir.call_args_list]
+    assert scanned.count(str(temp_project)) == 1
+    assert scanned.count(str(temp_project / 'packages')) == 1
+    mock_run.assert_called_once()
+
+
+@patch('subprocess.run')
+@pytest.mark.usefixtures('mock_which')
+def test_main_directory_argument(mock_run: MagicMock, temp_project: Path) -> None:
+    """Test that a directory argument is detected from the directory itself, not its parent."""
+    mock_run.return_value = MagicMock(returncode=0)
+
+    (temp_project / 'pnpm-lock.yaml').touch()
+    proj_dir = temp_project / 'proj'
+    proj_dir.mkdir()
+    (proj_dir / 'yarn.lock').touch()
+
+    assert main([str(proj_dir)]) == 0
+
+    expected_cmd = ['/usr/bin/yarn', 'run', 'eslint', '--fix', str(proj_dir)]
+    mock_run.assert_called_once_with(expected_cmd, capture_output=False, check=False)